@@ -1,15 +1,35 @@
-from flask import Flask, request, render_template_string, jsonify, redirect, url_for
+from flask import Flask, Response, request, render_template_string, jsonify, redirect, url_for
+import csv
+import io
+import json
 import sqlite3
 from datetime import datetime
 
 app = Flask(__name__)
 
-# Initialize SQLite database
-def init_db():
-    conn = sqlite3.connect('guests.db')
+# Create the guests table and bring older databases up to the current schema
+def migrate_db(database='guests.db'):
+    conn = sqlite3.connect(database)
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS guests 
-                 (guest_number TEXT PRIMARY KEY, guest_name TEXT, guest_code TEXT UNIQUE, scanned INTEGER DEFAULT 0, scan_time TEXT)''')
+                 (guest_number TEXT PRIMARY KEY, guest_name TEXT, guest_code TEXT UNIQUE, scanned INTEGER DEFAULT 0, scan_time TEXT, gate TEXT)''')
+    # Databases created before gates were recorded lack the gate column
+    c.execute('PRAGMA table_info(guests)')
+    if 'gate' not in [column[1] for column in c.fetchall()]:
+        c.execute('ALTER TABLE guests ADD COLUMN gate TEXT')
+    conn.commit()
+    conn.close()
+
+# Gunicorn imports app:app without running __main__, so migrate on the first request instead
+@app.before_first_request
+def migrate_on_startup():
+    migrate_db()
+
+# Initialize SQLite database
+def init_db(database='guests.db'):
+    migrate_db(database)
+    conn = sqlite3.connect(database)
+    c = conn.cursor()
     # Sample guest data (replace with your guest list)
     sample_guests = [
         ('001', 'John Doe', 'GUEST123', 0, ''),
@@ -30,30 +50,124 @@ def index():
 def catch_all(path):
     return '', 200
 
+# Attendance report settings
+REPORT_COLUMNS = ('guest_number', 'guest_name', 'guest_code', 'scanned', 'scan_time', 'gate')
+REPORT_CHUNK_SIZE = 500
+
+# Build the report WHERE clauses from the scanned/since/until filters
+def build_report_filters(args):
+    clauses = []
+    params = []
+    scanned = args.get('scanned')
+    if scanned is not None:
+        if scanned not in ('0', '1'):
+            raise ValueError('scanned must be 0 or 1.')
+        clauses.append('scanned = ?')
+        params.append(int(scanned))
+    for name, operator in (('since', '>='), ('until', '<')):
+        value = args.get(name)
+        if not value:
+            continue
+        try:
+            timestamp = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f'{name} must be an ISO 8601 timestamp.')
+        # scan_time is naive local time, so convert any UTC offset to local before comparing
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone().replace(tzinfo=None)
+        # Normalise to the isoformat() used for scan_time so strings compare in time order
+        value = timestamp.isoformat()
+        clauses.append(f'scanned = 1 AND scan_time {operator} ?')
+        params.append(value)
+    return clauses, params
+
+# Fetch the next page of report rows after the given guest_number
+def fetch_report_page(conn, clauses, params, after=None):
+    if after is not None:
+        clauses = clauses + ['guest_number > ?']
+        params = params + [after]
+    query = 'SELECT ' + ', '.join(REPORT_COLUMNS) + ' FROM guests'
+    if clauses:
+        query += ' WHERE ' + ' AND '.join(clauses)
+    # guest_number is the primary key, so each page is a short index range scan, not a sort
+    query += ' ORDER BY guest_number LIMIT ?'
+    # fetchall() runs the statement to completion, releasing SQLite's read lock before the page is sent
+    return conn.execute(query, params + [REPORT_CHUNK_SIZE]).fetchall()
+
+# Yield the report a page at a time so memory stays flat regardless of table size
+def generate_report(conn, clauses, params, rows, fmt):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(REPORT_COLUMNS)
+    while rows:
+        if fmt == 'csv':
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                buffer.write(json.dumps(dict(zip(REPORT_COLUMNS, row))) + '\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        if len(rows) < REPORT_CHUNK_SIZE:
+            break
+        rows = fetch_report_page(conn, clauses, params, after=rows[-1][0])
+    # Emit the header even when no rows match
+    if buffer.tell():
+        yield buffer.getvalue()
+
+# Attendance report export (CSV or JSON Lines)
+@app.route('/report/attendance.<fmt>')
+def attendance_report(fmt):
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'status': 'error', 'message': 'Report format must be csv or jsonl.'}), 404
+    try:
+        clauses, params = build_report_filters(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    conn = sqlite3.connect('guests.db')
+    # Page by guest_number instead of holding one cursor open, so no read transaction
+    # (and no lock blocking check-ins) stays open while a slow client downloads
+    rows = fetch_report_page(conn, clauses, params)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    # No Content-Length is set, so the server sends the body with chunked transfer encoding
+    response = Response(generate_report(conn, clauses, params, rows, fmt), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=attendance.{fmt}'
+    response.call_on_close(conn.close)
+    return response
+
+# Check-in core: validate a guest code and mark it scanned, returning (status, message).
+# Kept free of Flask so it can also be driven in-process (see simulate.py).
+def check_in(conn, guest_code, gate=''):
+    c = conn.cursor()
+    c.execute('SELECT guest_number, guest_name, scanned FROM guests WHERE guest_code = ?', (guest_code,))
+    guest = c.fetchone()
+    
+    if not guest:
+        return 'error', 'Invalid guest code.'
+    
+    guest_number, guest_name, scanned = guest
+    if scanned == 1:
+        return 'error', 'This code has already been used.'
+    
+    # Mark as scanned
+    c.execute('UPDATE guests SET scanned = 1, scan_time = ?, gate = ? WHERE guest_code = ?', (datetime.now().isoformat(), gate, guest_code))
+    conn.commit()
+    return 'success', f'Welcome, {guest_name}! Guest Number: {guest_number}'
+
 # Verification route
 @app.route('/gate', methods=['GET', 'POST'])
 def verify_guest():
     if request.method == 'POST':
         guest_code = request.form.get('guest_code')
+        gate = request.form.get('gate', '')
         conn = sqlite3.connect('guests.db')
-        c = conn.cursor()
-        c.execute('SELECT guest_number, guest_name, scanned FROM guests WHERE guest_code = ?', (guest_code,))
-        guest = c.fetchone()
-        
-        if not guest:
-            conn.close()
-            return jsonify({'status': 'error', 'message': 'Invalid guest code.'})
-        
-        guest_number, guest_name, scanned = guest
-        if scanned == 1:
+        try:
+            status, message = check_in(conn, guest_code, gate)
+        finally:
             conn.close()
-            return jsonify({'status': 'error', 'message': 'This code has already been used.'})
-        
-        # Mark as scanned
-        c.execute('UPDATE guests SET scanned = 1, scan_time = ? WHERE guest_code = ?', (datetime.now().isoformat(), guest_code))
-        conn.commit()
-        conn.close()
-        return jsonify({'status': 'success', 'message': f'Welcome, {guest_name}! Guest Number: {guest_number}'})
+        return jsonify({'status': status, 'message': message})
     
     # Enhanced front-end with wedding-themed design
     return render_template_string('''
@@ -163,6 +277,7 @@ def verify_guest():
             <div class="form-container">
                 <form id="verifyForm">
                     <input type="text" name="guest_code" placeholder="Enter Guest Code" required>
+                    <input type="hidden" name="gate" value="{{ gate }}">
                     <button type="submit">Confirm</button>
                 </form>
                 <div id="result"></div>
@@ -184,7 +299,7 @@ def verify_guest():
         </script>
     </body>
     </html>
-    ''')
+    ''', gate=request.args.get('gate', ''))
 
 if __name__ == '__main__':
     init_db()
@@ -0,0 +1,359 @@
+"""Offline gate throughput simulator for capacity planning.
+
+Replays a wedding's arrivals through a discrete-event model of the gates,
+the web workers and SQLite's locks. Every scan is checked in with the real
+``check_in`` core from app.py against a throwaway database, so outcomes
+(invalid codes, reused codes, rejected scans) and database timings come from
+the actual code path, without Flask or HTTP in the loop.
+
+Each real call is split into its read (SELECT) and write (UPDATE + commit)
+phases, which are scheduled against the lock rules of the journal mode. In
+rollback-journal modes (delete, truncate) reads take a shared lock and the
+write needs the database to itself, so readers and the writer block each
+other. In WAL mode reads take no lock and only writers queue behind each
+other.
+
+Example:
+    python simulate.py --guests 5000 --gates 2 4 6 --workers 1 2 4 --journal-mode delete wal
+"""
+import argparse
+import csv
+import heapq
+import itertools
+import os
+import random
+import sqlite3
+import statistics
+import string
+import tempfile
+import time
+from collections import Counter, deque
+
+from app import check_in, init_db
+
+ARRIVAL_PATTERNS = ('uniform', 'poisson', 'peak')
+JOURNAL_MODES = ('delete', 'truncate', 'wal')
+TYPO_CHARACTERS = string.ascii_uppercase + string.digits
+
+
+# Load (card_number, guest_code) pairs, padding with synthetic guests past the end of the list
+def load_guests(path, count):
+    with open(path, newline='') as f:
+        guests = [(row['card_number'], row['guest_code']) for row in csv.DictReader(f)][:count]
+    guests.extend((f'{i:05d}', f'G-{i:05d}') for i in range(len(guests) + 1, count + 1))
+    return guests
+
+
+# Create a fresh database with the app's schema and the simulated guest list
+def build_database(path, guests, journal_mode):
+    init_db(path)
+    conn = sqlite3.connect(path)
+    conn.execute(f'PRAGMA journal_mode={journal_mode}')
+    # Drop init_db's sample guests so they don't shadow card numbers from the list
+    conn.execute('DELETE FROM guests')
+    conn.executemany('INSERT OR IGNORE INTO guests (guest_number, guest_name, guest_code, scanned, scan_time) VALUES (?, ?, ?, 0, ?)',
+                     [(number, f'Guest {number}', code, '') for number, code in guests])
+    conn.commit()
+    conn.close()
+
+
+# Arrival times in seconds from doors opening, sorted
+def arrival_times(rng, pattern, count, window):
+    if pattern == 'uniform':
+        times = [rng.uniform(0, window) for _ in range(count)]
+    elif pattern == 'poisson':
+        rate = count / window
+        times = list(itertools.accumulate(rng.expovariate(rate) for _ in range(count)))
+    else:
+        # Most guests turn up in the last stretch before the ceremony
+        times = [rng.triangular(0, window, window * 0.8) for _ in range(count)]
+    return sorted(times)
+
+
+# Swap one character of a code for another, as a mistyped entry would
+def swap_character(rng, code):
+    # Leave the 'G-' prefix alone unless there is nothing after it
+    start = 2 if len(code) > 2 else 0
+    if len(code) <= start:
+        return code + rng.choice(TYPO_CHARACTERS)
+    position = rng.randrange(start, len(code))
+    replacement = rng.choice(TYPO_CHARACTERS.replace(code[position], ''))
+    return code[:position] + replacement + code[position + 1:]
+
+
+# Mistype a code without landing on another guest's code, so every typo is rejected
+def mistype(rng, code, issued):
+    for _ in range(100):
+        typo = swap_character(rng, code)
+        if typo not in issued:
+            return typo
+    # Every swap tried was another issued code; lengthen the code instead
+    typo = code
+    while typo in issued:
+        typo += rng.choice(TYPO_CHARACTERS)
+    return typo
+
+
+# Build the arrival list: each entry is (arrival_time, codes tried in order at the gate, scan time per code)
+def build_arrivals(rng, guests, args):
+    issued = {code for _, code in guests}
+    attempts = []
+    for _, code in guests:
+        if rng.random() < args.typo_rate:
+            # A mistyped code is rejected and the scanner re-enters it correctly
+            attempts.append([mistype(rng, code, issued), code])
+        else:
+            attempts.append([code])
+    # Shared or screenshotted invitations presented by someone else
+    duplicates = int(round(len(guests) * args.duplicate_rate))
+    attempts.extend([rng.choice(guests)[1]] for _ in range(duplicates))
+    rng.shuffle(attempts)
+    times = arrival_times(rng, args.arrival, len(attempts), args.window * 60)
+    # Scan times are drawn here, not during the run, so gate timing depends only on the seed
+    # and not on the order that wall-clock database timings give the events
+    scan_times = [[rng.gammavariate(4, args.scan_time / 4) for _ in codes] for codes in attempts]
+    return list(zip(times, attempts, scan_times))
+
+
+# Run the real check-in on its own connection, as verify_guest does.
+# Returns the result and the seconds spent reading and writing (None if nothing was written).
+def timed_check_in(database, journal_mode, code, gate):
+    statements = []
+    started = time.perf_counter()
+    conn = sqlite3.connect(database)
+    # Only WAL is stored in the database file; delete and truncate must be set on every connection
+    conn.execute(f'PRAGMA journal_mode={journal_mode}')
+    conn.set_trace_callback(lambda statement: statements.append((time.perf_counter(), statement)))
+    try:
+        result = check_in(conn, code, gate)
+    finally:
+        conn.close()
+    finished = time.perf_counter()
+    # Everything from the first statement that isn't a SELECT (BEGIN, UPDATE, COMMIT) is the write
+    write_started = next((at for at, statement in statements if not statement.lstrip().upper().startswith('SELECT')), None)
+    if write_started is None:
+        return result, finished - started, None
+    return result, write_started - started, finished - write_started
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# Run one configuration and return its summary metrics
+def simulate(arrivals, database, gates, workers, journal_mode, args):
+    events = []
+    sequence = itertools.count()
+
+    def schedule(at, kind, payload):
+        heapq.heappush(events, (at, next(sequence), kind, payload))
+
+    gate_queues = [deque() for _ in range(gates)]
+    gate_busy = [False] * gates
+    max_queue = 0
+    idle_workers = workers
+    worker_queue = deque()
+    wal = journal_mode == 'wal'
+    readers = 0
+    writing = False
+    lock_queue = deque()
+    write_time = 0.0
+
+    gate_waits = []
+    worker_waits = []
+    lock_waits = []
+    db_times = []
+    outcomes = Counter()
+    rejected_scans = 0
+    retry_time = 0.0
+    last_admission = 0.0
+
+    def start_scan(gate, now):
+        arrived, codes, scan_times = gate_queues[gate].popleft()
+        gate_busy[gate] = True
+        gate_waits.append(now - arrived)
+        schedule(now + scan_times[0], 'scanned', (gate, codes, scan_times, 0, None))
+
+    def start_request(request, now):
+        nonlocal idle_workers
+        idle_workers -= 1
+        worker_waits.append(now - request['queued'])
+        schedule(now + args.request_overhead / 1000, 'database', request)
+
+    def lock_available(mode):
+        if mode == 'shared':
+            return not writing
+        # Only rollback-journal writers have to wait for readers to finish
+        return not writing and (wal or not readers)
+
+    def grant_lock(request, mode, now):
+        nonlocal readers, writing, write_time
+        if mode == 'shared':
+            readers += 1
+            held = request['read']
+        else:
+            writing = True
+            held = request['write']
+            write_time += held
+        lock_waits.append(now - request['queued'])
+        schedule(now + held, 'released', (request, mode))
+
+    def request_lock(request, mode, now):
+        request['queued'] = now
+        # First come, first served: a waiting writer holds back later readers, as SQLite's pending lock does
+        if not lock_queue and lock_available(mode):
+            grant_lock(request, mode, now)
+        else:
+            lock_queue.append((request, mode))
+
+    for arrived, codes, scan_times in arrivals:
+        schedule(arrived, 'arrive', (codes, scan_times))
+
+    now = 0.0
+    while events:
+        now, _, kind, payload = heapq.heappop(events)
+        if kind == 'arrive':
+            # Guests join the shortest line, counting the guest being scanned
+            gate = min(range(gates), key=lambda g: len(gate_queues[g]) + gate_busy[g])
+            gate_queues[gate].append((now, *payload))
+            max_queue = max(max_queue, len(gate_queues[gate]))
+            if not gate_busy[gate]:
+                start_scan(gate, now)
+        elif kind == 'scanned':
+            gate, codes, scan_times, attempt, rejected_at = payload
+            request = {'gate': gate, 'codes': codes, 'scan_times': scan_times, 'attempt': attempt, 'code': codes[attempt],
+                       'rejected_at': rejected_at, 'queued': now}
+            if idle_workers:
+                start_request(request, now)
+            else:
+                worker_queue.append(request)
+        elif kind == 'database':
+            payload['result'], payload['read'], payload['write'] = timed_check_in(
+                database, journal_mode, payload['code'], f'Gate {payload["gate"] + 1}')
+            db_times.append(payload['read'] + (payload['write'] or 0))
+            if wal:
+                # WAL readers work from a snapshot and never wait
+                schedule(now + payload['read'], 'released', (payload, None))
+            else:
+                request_lock(payload, 'shared', now)
+        elif kind == 'released':
+            request, mode = payload
+            if mode == 'shared':
+                readers -= 1
+            elif mode == 'exclusive':
+                writing = False
+            while lock_queue and lock_available(lock_queue[0][1]):
+                grant_lock(*lock_queue.popleft(), now)
+            if mode != 'exclusive' and request['write'] is not None:
+                request_lock(request, 'exclusive', now)
+            else:
+                schedule(now, 'done', request)
+        elif kind == 'done':
+            idle_workers += 1
+            if worker_queue:
+                start_request(worker_queue.popleft(), now)
+
+            gate, codes, scan_times, attempt = payload['gate'], payload['codes'], payload['scan_times'], payload['attempt']
+            rejected_at = payload['rejected_at']
+            status, message = payload['result']
+            if status == 'error':
+                rejected_scans += 1
+                if rejected_at is None:
+                    rejected_at = now
+                if attempt + 1 < len(codes):
+                    # Re-enter the code at the same gate before serving the next guest
+                    schedule(now + scan_times[attempt + 1], 'scanned', (gate, codes, scan_times, attempt + 1, rejected_at))
+                    continue
+            if attempt:
+                # Gate time spent re-entering codes after the first rejection
+                retry_time += now - payload['rejected_at']
+            outcomes['admitted' if status == 'success' else message] += 1
+            if status == 'success':
+                last_admission = now
+            gate_busy[gate] = False
+            if gate_queues[gate]:
+                start_scan(gate, now)
+
+    return {
+        'admitted': outcomes['admitted'],
+        'invalid': outcomes['Invalid guest code.'],
+        'reused': outcomes['This code has already been used.'],
+        'rejected_scans': rejected_scans,
+        'retry_time': retry_time,
+        'wait_mean': statistics.fmean(gate_waits) if gate_waits else 0.0,
+        'wait_p95': percentile(gate_waits, 0.95),
+        'wait_max': max(gate_waits, default=0.0),
+        'max_queue': max_queue,
+        'worker_wait_max': max(worker_waits, default=0.0),
+        'lock_wait_max': max(lock_waits, default=0.0),
+        'db_mean': statistics.fmean(db_times) if db_times else 0.0,
+        'write_utilisation': write_time / now if now else 0.0,
+        'finished': last_admission,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate gate throughput with the real check-in core.')
+    parser.add_argument('--guests', type=int, default=5000, help='number of invited guests (default: 5000)')
+    parser.add_argument('--guest-list', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'guest_list.csv'),
+                        help='CSV of card_number,guest_code used to seed guest codes')
+    parser.add_argument('--arrival', choices=ARRIVAL_PATTERNS, default='peak', help='arrival distribution (default: peak)')
+    parser.add_argument('--window', type=float, default=90, help='minutes over which guests arrive (default: 90)')
+    parser.add_argument('--gates', type=int, nargs='+', default=[4], help='gate counts to compare (default: 4)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1], help='web worker counts to compare (default: 1)')
+    parser.add_argument('--journal-mode', choices=JOURNAL_MODES, nargs='+', default=['delete'],
+                        help='SQLite journal modes to compare (default: delete)')
+    parser.add_argument('--scan-time', type=float, default=8, help='mean seconds a gate needs to scan one code (default: 8)')
+    parser.add_argument('--request-overhead', type=float, default=30,
+                        help='milliseconds of network and request handling outside the database (default: 30)')
+    parser.add_argument('--typo-rate', type=float, default=0.03, help='fraction of guests whose first entry is mistyped (default: 0.03)')
+    parser.add_argument('--duplicate-rate', type=float, default=0.01,
+                        help='extra arrivals presenting an already issued code, as a fraction of guests (default: 0.01)')
+    parser.add_argument('--seed', type=int, default=1, help='random seed (default: 1)')
+    args = parser.parse_args(argv)
+    for name in ('guests', 'window', 'scan_time'):
+        if getattr(args, name) <= 0:
+            parser.error(f'--{name.replace("_", "-")} must be positive')
+    for name in ('gates', 'workers'):
+        if min(getattr(args, name)) <= 0:
+            parser.error(f'--{name} must be positive')
+    if args.request_overhead < 0:
+        parser.error('--request-overhead cannot be negative')
+    for name in ('typo_rate', 'duplicate_rate'):
+        if not 0 <= getattr(args, name) <= 1:
+            parser.error(f'--{name.replace("_", "-")} must be between 0 and 1')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    guests = load_guests(args.guest_list, args.guests)
+    arrivals = build_arrivals(random.Random(args.seed), guests, args)
+    print(f'{len(guests)} guests, {len(arrivals)} arrivals ({args.arrival} over {args.window:g} min), '
+          f'scan time {args.scan_time:g}s, typo rate {args.typo_rate:g}, duplicate rate {args.duplicate_rate:g}')
+    print()
+    header = ('gates', 'workers', 'journal', 'admitted', 'invalid', 'reused', 'rejected', 'retry time', 'wait avg', 'wait p95', 'wait max',
+              'max queue', 'worker wait', 'lock wait', 'db ms', 'write busy', 'last in', 'runtime')
+    print('  '.join(f'{column:>11}' for column in header))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for journal_mode, gates, workers in itertools.product(args.journal_mode, args.gates, args.workers):
+            database = os.path.join(directory, f'guests-{journal_mode}-{gates}-{workers}.db')
+            build_database(database, guests, journal_mode)
+            started = time.perf_counter()
+            result = simulate(arrivals, database, gates, workers, journal_mode, args)
+            runtime = time.perf_counter() - started
+            row = (gates, workers, journal_mode, result['admitted'], result['invalid'], result['reused'],
+                   result['rejected_scans'], f'{result["retry_time"] / 60:.1f} min',
+                   f'{result["wait_mean"] / 60:.1f} min', f'{result["wait_p95"] / 60:.1f} min', f'{result["wait_max"] / 60:.1f} min',
+                   result['max_queue'], f'{result["worker_wait_max"] * 1000:.0f} ms', f'{result["lock_wait_max"] * 1000:.1f} ms',
+                   f'{result["db_mean"] * 1000:.2f}', f'{result["write_utilisation"]:.2%}',
+                   f'{result["finished"] / 60:.0f} min', f'{runtime:.1f}s')
+            print('  '.join(f'{value:>11}' for value in row))
+
+
+if __name__ == '__main__':
+    main()